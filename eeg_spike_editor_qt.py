@@ -24,16 +24,239 @@ for pkg in required_packages:
 #if missing:
 #    print("\nPackages manquants :", missing)
 
+import os
+import re
+import shutil
 import sys
+import tempfile
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import numpy as np
 import pandas as pd
 from PySide6 import QtWidgets, QtCore
 import pyqtgraph as pg
+from scipy import sparse
 from scipy.signal import butter, filtfilt, iirnotch
 from scipy.signal import find_peaks
+from scipy.signal import spectrogram
 
 # pip install PySide6 IPython pyqtgraph numpy pandas scipy
 
+# ---------------- Montages ----------------
+class Montage:
+    """
+    Montage défini par une matrice creuse (n_out x n_raw) de combinaison
+    des channels bruts : signal_montage = matrix @ signals_raw.
+    reference : indices des channels bruts dont la moyenne est soustraite
+    à chaque channel (référence moyenne), sans densifier la matrice.
+    Le montage n'est jamais appliqué à tout l'enregistrement, seulement
+    au bloc affiché (voir EEGEditor._get_block).
+    """
+
+    def __init__(self, name, matrix, channel_names, raw_names, reference=None):
+        self.name = name
+        self.matrix = sparse.csr_matrix(matrix, dtype=float)
+        self.channel_names = list(channel_names)
+        self.raw_names = list(raw_names)
+        self.reference = None if reference is None else np.asarray(reference, dtype=int)
+
+        n_out, n_raw = self.matrix.shape
+        if n_out != len(self.channel_names) or n_raw != len(self.raw_names):
+            raise ValueError(
+                f"Montage {name} : matrice {self.matrix.shape} incompatible avec "
+                f"{len(self.channel_names)} channels / {len(self.raw_names)} channels bruts"
+            )
+
+        # contacts de chaque channel (poids >= la moitié du poids max) :
+        # sert à faire correspondre les marqueurs d'un montage à l'autre
+        self.contacts = []
+        for row in range(n_out):
+            start, stop = self.matrix.indptr[row], self.matrix.indptr[row + 1]
+            cols = self.matrix.indices[start:stop]
+            weights = np.abs(self.matrix.data[start:stop])
+            if len(cols) == 0:
+                self.contacts.append(())
+                continue
+            keep = weights >= weights.max() / 2
+            self.contacts.append(tuple(self.raw_names[c] for c in cols[keep]))
+
+    def apply(self, signals, rows, s0, s1):
+        """Calcule les channels `rows` du montage sur les samples [s0, s1[."""
+        sub = self.matrix[rows]
+        cols = np.unique(sub.indices)
+        if cols.size == 0:
+            block = np.zeros((len(rows), max(0, s1 - s0)))
+        else:
+            block = np.asarray(sub[:, cols] @ signals[cols, s0:s1])
+        if self.reference is not None:
+            block -= signals[self.reference, s0:s1].mean(axis=0)
+        return block
+
+
+def monopolar_montage(channel_names):
+    n = len(channel_names)
+    return Montage("Monopolar", sparse.identity(n, format="csr"),
+                   channel_names, channel_names)
+
+
+def bipolar_montage(channel_names, sens='2-1'):
+    """
+    Bipolaire entre contacts consécutifs d'une même électrode (ex : A1, A2).
+    sens='2-1' donne A2-A1, sens='1-2' donne A1-A2.
+    """
+    pattern = re.compile(r"^(.*?)(\d+)$")
+    contacts = {}
+    for i, name in enumerate(channel_names):
+        m = pattern.match(str(name).strip())
+        if m:
+            contacts[(m.group(1), int(m.group(2)))] = i
+
+    rows, cols, vals, names = [], [], [], []
+    for i, name in enumerate(channel_names):
+        m = pattern.match(str(name).strip())
+        if not m:
+            continue
+        nxt = contacts.get((m.group(1), int(m.group(2)) + 1))
+        if nxt is None:
+            continue
+        pos, neg = (nxt, i) if sens == '2-1' else (i, nxt)
+        row = len(names)
+        rows += [row, row]
+        cols += [pos, neg]
+        vals += [1.0, -1.0]
+        names.append(f"{channel_names[pos]}-{channel_names[neg]}")
+
+    matrix = sparse.csr_matrix((vals, (rows, cols)),
+                               shape=(len(names), len(channel_names)))
+    return Montage("Bipolar", matrix, names, channel_names)
+
+
+def average_montage(channel_names):
+    n = len(channel_names)
+    return Montage("Average", sparse.identity(n, format="csr"),
+                   channel_names, channel_names, reference=np.arange(n))
+
+
+def _compute_spacing(montage, signals):
+    # calculé sur les données sous-échantillonnées, une fois par montage
+    step = max(1, signals.shape[1] // 100000)
+    decimated = montage.matrix @ signals[:, ::step]
+    if montage.reference is not None:
+        decimated -= signals[montage.reference, ::step].mean(axis=0)
+    return np.percentile(np.abs(decimated), 95) * 3
+
+
+def default_montages(channel_names, sens='2-1'):
+    """Monopolaire, bipolaire et référence moyenne, calculés à la volée."""
+    montages = [monopolar_montage(channel_names),
+                bipolar_montage(channel_names, sens=sens),
+                average_montage(channel_names)]
+    return {m.name: m for m in montages if len(m.channel_names) > 0}
+
+
+# ---------------- Marker index ----------------
+class MarkerIndex:
+    """
+    Index des marqueurs : samples triés par nom de channel (nom d'origine
+    du marqueur), mis à jour incrémentalement. Répond sans parcourir le
+    DataFrame aux requêtes fenêtre / marqueur suivant / précédent / nombre.
+    """
+
+    def __init__(self, markers_df=None):
+        self.rebuild(markers_df)
+
+    def rebuild(self, markers_df):
+        self._by_channel = {}
+        if markers_df is None or len(markers_df) == 0:
+            return
+        samples = markers_df["sample"].values.astype(int)
+        for name, pos in markers_df.groupby("channel").indices.items():
+            self._by_channel[name] = np.sort(samples[pos])
+
+    def add(self, name, samples):
+        samples = np.sort(np.asarray(samples, dtype=int))
+        arr = self._by_channel.get(name, np.empty(0, dtype=int))
+        self._by_channel[name] = np.insert(arr, np.searchsorted(arr, samples), samples)
+
+    def remove(self, name, samples):
+        arr = self._by_channel.get(name)
+        if arr is None:
+            return
+        for sample in np.asarray(samples, dtype=int):
+            i = np.searchsorted(arr, sample)
+            if i < len(arr) and arr[i] == sample:
+                arr = np.delete(arr, i)
+        self._by_channel[name] = arr
+
+    def window(self, name, s0, s1):
+        """Samples du channel dans [s0, s1[."""
+        arr = self._by_channel.get(name)
+        if arr is None:
+            return np.empty(0, dtype=int)
+        return arr[np.searchsorted(arr, s0):np.searchsorted(arr, s1)]
+
+    def next(self, cursor, names):
+        """
+        Premier marqueur strictement après cursor = (sample, rang), dans l'ordre
+        (sample, rang) : les marqueurs simultanés sont visités un rang après
+        l'autre. names : liste de (rang, nom de channel).
+        Renvoie (sample, rang, nom) ou None.
+        """
+        sample, rank = cursor
+        best = None
+        for r, name in names:
+            arr = self._by_channel.get(name)
+            if arr is None:
+                continue
+            i = np.searchsorted(arr, sample, side='left' if r > rank else 'right')
+            if i < len(arr) and (best is None or (arr[i], r) < best[:2]):
+                best = (int(arr[i]), r, name)
+        return best
+
+    def prev(self, cursor, names):
+        """Dernier marqueur strictement avant cursor = (sample, rang), voir next."""
+        sample, rank = cursor
+        best = None
+        for r, name in names:
+            arr = self._by_channel.get(name)
+            if arr is None:
+                continue
+            i = np.searchsorted(arr, sample, side='right' if r < rank else 'left') - 1
+            if i >= 0 and (best is None or (arr[i], r) > best[:2]):
+                best = (int(arr[i]), r, name)
+        return best
+
+    def count(self, name):
+        arr = self._by_channel.get(name)
+        return 0 if arr is None else len(arr)
+
+
+# ---------------- Spectrogram worker ----------------
+class _SpectroSignals(QtCore.QObject):
+    done = QtCore.Signal(object, object)
+
+
+class _SpectroTask(QtCore.QRunnable):
+    """Calcule une tuile STFT (dB, jusqu'à Nyquist) hors du thread graphique."""
+
+    def __init__(self, key, data, fs, nperseg, hop, signals):
+        super().__init__()
+        self.key = key
+        self.data = data
+        self.fs = fs
+        self.nperseg = nperseg
+        self.hop = hop
+        self.signals = signals
+
+    def run(self):
+        f, _, sxx = spectrogram(self.data, fs=self.fs, nperseg=self.nperseg,
+                                noverlap=self.nperseg - self.hop, mode='psd')
+        power = 10 * np.log10(sxx + np.finfo(float).tiny)
+        self.signals.done.emit(self.key, (f, power))
+
+
 # ---------------- ViewBox custom ----------------
 class EEGViewBox(pg.ViewBox):
     def __init__(self, editor=None):
@@ -67,24 +290,45 @@ class EEGViewBox(pg.ViewBox):
 # ---------------- EEG Editor ----------------
 class EEGEditor(QtWidgets.QMainWindow):
     def __init__(self, signals, times, channel_names, markers_df=None,
-                 window_sec=20, n_display=20):
+                 window_sec=20, n_display=20, montages=None,
+                 filtered_signals=None, bandpass=None, spacing=None, copy=True):
         super().__init__()
 
-        self.signals_raw = signals.copy()
-        self.signals = signals.copy()
+        # une seule copie des données brutes : les montages sont calculés
+        # à la volée sur le bloc affiché, les filtres produisent self.signals.
+        # copy=False quand l'appelant cède ses données (ex : ReviewSession)
+        self.signals_raw = signals.copy() if copy else signals
+        self.signals = self.signals_raw if filtered_signals is None else filtered_signals
         self.times = times
-        self.channel_names = channel_names
+        self.raw_channel_names = list(channel_names)
         self.markers_df = markers_df
 
-        self.n_channels, self.n_times = signals.shape
+        self.n_times = signals.shape[1]
         self.fs = 1 / np.mean(np.diff(times))
 
+        if montages is None:
+            montages = {"Monopolar": monopolar_montage(self.raw_channel_names)}
+        self.montages = dict(montages)
+        self._block_cache = OrderedDict()
+        self._block_cache_size = 8
+        self._spacing_cache = dict(spacing or {})
+
+        # nom de channel (tous montages confondus) -> contacts qui le composent
+        self._contacts_of = {name: (name,) for name in self.raw_channel_names}
+        for montage in self.montages.values():
+            self._contacts_of.update(zip(montage.channel_names, montage.contacts))
+
+        self.marker_index = MarkerIndex(markers_df)
+        self.sort_by_activity = False
+        self._nav_cursor = None
+
+        self._set_montage(next(iter(self.montages)))
+
         self.window_sec = window_sec
         self.n_display = n_display
         self.current_chan_start = 0
         self.start_idx = 0
         self.gain = 1.0
-        self.channel_spacing = np.percentile(np.abs(signals), 95) * 3
 
         self.rm_mode = False
         self.dragging = False
@@ -95,7 +339,28 @@ class EEGEditor(QtWidgets.QMainWindow):
         self.curves = {}
         self.spike_items = {}
 
+        # spectrogramme : tuiles STFT en cache LRU, calculées sur un pool de threads
+        self.focus_channel = None
+        self.spectro_nperseg = int(2 ** np.ceil(np.log2(self.fs / 8)))
+        self.spectro_hop = max(1, self.spectro_nperseg // 4)
+        self.spectro_tile_len = self.spectro_hop * int(np.ceil(2 * self.fs / self.spectro_hop))
+        self._signals_version = 0
+        self._spectro_cache = OrderedDict()
+        self._spectro_cache_size = 256
+        self._spectro_pending = set()
+        self._spectro_images = []
+        self._spectro_levels = None
+        self._spectro_pool = QtCore.QThreadPool()
+        self._spectro_pool.setMaxThreadCount(2)
+        self._spectro_signals = _SpectroSignals()
+        self._spectro_signals.done.connect(self._on_spectro_tile)
+
+        self.session = None
+
         self._init_ui()
+        if bandpass is not None:
+            self.bp_low.setValue(bandpass[0])
+            self.bp_high.setValue(bandpass[1])
         self._plot_signals()
         
         self.add_mode = False
@@ -114,7 +379,18 @@ class EEGEditor(QtWidgets.QMainWindow):
         self.plot_widget.setLabel('bottom', 'Temps (s)')
         self.plot_item = self.plot_widget.getPlotItem()
         self.plot_item.getAxis('left').setTicks(self._make_channel_ticks())
-        layout.addWidget(self.plot_widget)
+        self.plot_item.getAxis('left').setWidth(90)
+        layout.addWidget(self.plot_widget, stretch=3)
+
+        # panneau temps-fréquence, aligné en temps sur les tracés
+        self.spectro_widget = pg.PlotWidget(background='#F0F0F0')
+        self.spectro_widget.setXLink(self.plot_widget)
+        self.spectro_widget.setMouseEnabled(x=False, y=False)
+        self.spectro_widget.getViewBox().disableAutoRange()
+        self.spectro_widget.getPlotItem().getAxis('left').setWidth(90)
+        self.spectro_widget.setLabel('left', 'Fréquence (Hz)')
+        self.spectro_widget.hide()
+        layout.addWidget(self.spectro_widget, stretch=1)
 
         self.slider = QtWidgets.QSlider(QtCore.Qt.Orientation.Horizontal)
         self.slider.setMinimum(0)
@@ -135,12 +411,24 @@ class EEGEditor(QtWidgets.QMainWindow):
         self.btn_rm.setCheckable(True)
         self.btn_exit = QtWidgets.QPushButton("Exit")
         self.btn_save = QtWidgets.QPushButton("Save mk")
+        self.btn_next_rec = QtWidgets.QPushButton("Next rec")
+        self.btn_next_rec.hide()
         self.btn_undo = QtWidgets.QPushButton("Undo")
         self.btn_add_train = QtWidgets.QPushButton("Add train")
         self.btn_add_train.setCheckable(True)
         self.bp_std_deriv_train = QtWidgets.QDoubleSpinBox()
         self.bp_std_deriv_train.setValue(0.5)
 
+        self.btn_sort = QtWidgets.QPushButton("Sort by rate")
+        self.btn_sort.setCheckable(True)
+
+        self.btn_spectro = QtWidgets.QPushButton("Spectro")
+        self.btn_spectro.setCheckable(True)
+        self.spectro_fmax = QtWidgets.QDoubleSpinBox()
+        self.spectro_fmax.setMaximum(self.fs / 2)
+        self.spectro_fmax.setValue(min(self.fs / 2, 250.0))
+        self.spectro_fmax.setSuffix(" Hz")
+
         self.bp_low = QtWidgets.QDoubleSpinBox()
         self.bp_high = QtWidgets.QDoubleSpinBox()
         self.bp_low.setValue(1.0)
@@ -155,11 +443,16 @@ class EEGEditor(QtWidgets.QMainWindow):
         self.btn_bp = QtWidgets.QPushButton("Apply Band-pass")
         self.btn_notch = QtWidgets.QPushButton("Apply Notch")
 
+        self.montage_box = QtWidgets.QComboBox()
+        self.montage_box.addItems(list(self.montages))
+
         controls.addWidget(self.btn_plus, 0, 0)
         controls.addWidget(self.btn_minus, 0, 1)
         controls.addWidget(self.btn_prev, 0, 3)
         controls.addWidget(self.btn_next, 0, 4)
+        controls.addWidget(self.montage_box, 0, 5)
         controls.addWidget(self.btn_exit, 3, 5)
+        controls.addWidget(self.btn_next_rec, 2, 5)
 
         controls.addWidget(self.btn_add, 3, 0)
         controls.addWidget(self.btn_rm, 3, 1)
@@ -169,6 +462,10 @@ class EEGEditor(QtWidgets.QMainWindow):
         controls.addWidget(self.btn_add_train, 4, 0)
         controls.addWidget(self.bp_std_deriv_train, 4, 1)
 
+        controls.addWidget(self.btn_sort, 4, 2)
+        controls.addWidget(self.btn_spectro, 4, 3)
+        controls.addWidget(self.spectro_fmax, 4, 4)
+
         controls.addWidget(QtWidgets.QLabel("BP low"), 1, 0)
         controls.addWidget(self.bp_low, 1, 1)
         controls.addWidget(QtWidgets.QLabel("BP high"), 2, 0)
@@ -189,10 +486,95 @@ class EEGEditor(QtWidgets.QMainWindow):
         self.btn_bp.clicked.connect(self._apply_bandpass)
         self.btn_notch.clicked.connect(self._apply_notch)
         self.btn_save.clicked.connect(self._save_markers)
+        self.btn_next_rec.clicked.connect(self._next_recording)
+        self.montage_box.currentTextChanged.connect(self._on_montage_changed)
         
 
 
         self.btn_add_train.clicked.connect(self._toggle_add_train_mode)
+        self.btn_sort.clicked.connect(self._toggle_sort_by_activity)
+        self.btn_spectro.clicked.connect(self._toggle_spectro)
+        self.spectro_fmax.valueChanged.connect(lambda _: self._update_spectro())
+
+    # ---------------- Montage ----------------
+    def _set_montage(self, name):
+        self.montage = self.montages[name]
+        self.channel_names = self.montage.channel_names
+        self.n_channels = len(self.channel_names)
+        self.channel_spacing = self._montage_spacing()
+        self._map_marker_names()
+        self.channel_order = (self._activity_order() if self.sort_by_activity
+                              else list(range(self.n_channels)))
+        self._nav_cursor = None
+
+    def _on_montage_changed(self, name):
+        self._set_montage(name)
+        self.focus_channel = None
+        self.current_chan_start = min(self.current_chan_start,
+                                      max(0, self.n_channels - self.n_display))
+        self._plot_signals()
+
+    def _montage_spacing(self):
+        if self.montage.name not in self._spacing_cache:
+            self._spacing_cache[self.montage.name] = _compute_spacing(self.montage, self.signals_raw)
+        return self._spacing_cache[self.montage.name]
+
+    def _visible_channels(self):
+        return self.channel_order[self.current_chan_start:
+                                  self.current_chan_start + self.n_display]
+
+    def _get_block(self, s0, s1):
+        """Channels visibles du montage courant sur [s0, s1[, avec cache LRU."""
+        rows = tuple(self._visible_channels())
+        key = (self.montage.name, rows, s0, s1)
+        block = self._block_cache.get(key)
+        if block is None:
+            block = self.montage.apply(self.signals, list(rows), s0, s1)
+            self._block_cache[key] = block
+            if len(self._block_cache) > self._block_cache_size:
+                self._block_cache.popitem(last=False)
+        else:
+            self._block_cache.move_to_end(key)
+        return block
+
+    def _map_marker_names(self):
+        """
+        Channels du montage courant où s'affiche un marqueur, selon son nom
+        (le nom d'origine est conservé) : son propre channel s'il appartient
+        au montage, sinon tous les channels contenant l'un de ses contacts.
+        """
+        own = {name: row for row, name in enumerate(self.channel_names)}
+        rows_of_contact = {}
+        for row, contacts in enumerate(self.montage.contacts):
+            for contact in contacts:
+                rows_of_contact.setdefault(contact, []).append(row)
+
+        self._names_of_row = [[] for _ in range(self.n_channels)]
+        for name, contacts in self._contacts_of.items():
+            if name in own:
+                rows = [own[name]]
+            else:
+                rows = sorted({row for c in contacts for row in rows_of_contact.get(c, [])})
+            for row in rows:
+                self._names_of_row[row].append(name)
+
+        # vérification : marqueurs qu'aucun channel de ce montage ne peut afficher
+        if self.markers_df is not None and len(self.markers_df) > 0:
+            shown = {name for names in self._names_of_row for name in names}
+            hidden = set(self.markers_df["channel"]) - shown
+            if hidden:
+                warnings.warn(f"Montage {self.montage.name} : marqueurs non affichés "
+                              f"sur {sorted(map(str, hidden))}", stacklevel=2)
+
+    def _row_markers(self, row, s0, s1):
+        """Samples des marqueurs affichés sur le channel `row` dans [s0, s1[."""
+        windows = [self.marker_index.window(name, s0, s1) for name in self._names_of_row[row]]
+        if not windows:
+            return np.empty(0, dtype=int)
+        return np.unique(np.concatenate(windows))
+
+    def _row_count(self, row):
+        return sum(self.marker_index.count(name) for name in self._names_of_row[row])
 
     # ---------------- Zoom ----------------
     def _zoom_in(self):
@@ -242,6 +624,13 @@ class EEGEditor(QtWidgets.QMainWindow):
             return
         
         if not self.rm_mode:
+            # -------- SELECTION CHANNEL (spectrogramme) --------
+            pos = ev.scenePos()
+            mouse_point = self.plot_widget.getViewBox().mapSceneToView(pos)
+            _, ch_idx = self._get_closest_channel(mouse_point.x(), mouse_point.y())
+            if ch_idx is not None:
+                self.focus_channel = ch_idx
+                self._update_spectro()
             return
         pos = ev.scenePos()
         mouse_point = self.plot_widget.getViewBox().mapSceneToView(pos)
@@ -341,7 +730,7 @@ class EEGEditor(QtWidgets.QMainWindow):
         s0 = max(0, sample - window)
         s1 = min(self.n_times, sample + window + 1)
 
-        segment = self.signals[selected_idx, s0:s1]
+        segment = self.montage.apply(self.signals, [selected_idx], s0, s1)[0]
 
         if len(segment) == 0:
             return
@@ -363,6 +752,7 @@ class EEGEditor(QtWidgets.QMainWindow):
         })
 
         self.markers_df = pd.concat([self.markers_df, new_row], ignore_index=True)
+        self.marker_index.add(selected_channel, [best_sample])
 
         # ---------------------------
         # 6. refresh affichage
@@ -390,11 +780,14 @@ class EEGEditor(QtWidgets.QMainWindow):
         offset = 0
         best_score = -np.inf
         best_idx = None
+        best_row = None
+
+        visible = self._visible_channels()
+        block = self.montage.apply(self.signals, visible, s0, s1)
 
-        for ch_idx in range(self.current_chan_start,
-                            min(self.current_chan_start + self.n_display, self.n_channels)):
+        for row, ch_idx in enumerate(visible):
 
-            sig = self.signals[ch_idx, s0:s1] * self.gain + offset
+            sig = block[row] * self.gain + offset
 
             # score = nombre de points dans la fenêtre Y
             mask = (sig >= min(y0, y1)) & (sig <= max(y0, y1))
@@ -403,6 +796,7 @@ class EEGEditor(QtWidgets.QMainWindow):
             if score > best_score:
                 best_score = score
                 best_idx = ch_idx
+                best_row = row
 
             offset += self.channel_spacing
 
@@ -414,7 +808,7 @@ class EEGEditor(QtWidgets.QMainWindow):
         # ---------------------------
         # 3. extraire segment brut (sans offset)
         # ---------------------------
-        segment = self.signals[best_idx, s0:s1]
+        segment = block[best_row]
 
         # ---------------------------
         # 4. détecter pics + et -
@@ -473,6 +867,7 @@ class EEGEditor(QtWidgets.QMainWindow):
         })
 
         self.markers_df = pd.concat([self.markers_df, new_rows], ignore_index=True)
+        self.marker_index.add(selected_channel, peaks_global)
 
         # ---------------------------
         # 7. refresh
@@ -487,14 +882,15 @@ class EEGEditor(QtWidgets.QMainWindow):
 
         s0, s1 = sorted([int(t0 * self.fs), int(t1 * self.fs)])
 
-        visible_channels = self.channel_names[
-            self.current_chan_start : self.current_chan_start + self.n_display
-        ]
+        visible_names = {name for ch_idx in self._visible_channels()
+                         for name in self._names_of_row[ch_idx]}
 
         mask_time = (self.markers_df["sample"] >= s0) & (self.markers_df["sample"] <= s1)
-        mask_chan = self.markers_df["channel"].isin(visible_channels)
+        mask_chan = self.markers_df["channel"].isin(visible_names)
         mask_delete = mask_time & mask_chan
 
+        for name, rows in self.markers_df[mask_delete].groupby("channel"):
+            self.marker_index.remove(name, rows["sample"].values)
         self.markers_df = self.markers_df[~mask_delete].reset_index(drop=True)
         self._plot_signals()
         
@@ -513,10 +909,12 @@ class EEGEditor(QtWidgets.QMainWindow):
         best_channel = None
         best_idx = None
 
-        for ch_idx in range(self.current_chan_start,
-                            min(self.current_chan_start + self.n_display, self.n_channels)):
+        visible = self._visible_channels()
+        values = self.montage.apply(self.signals, visible, sample, sample + 1)[:, 0]
 
-            y_signal = self.signals[ch_idx, sample] * self.gain + offset
+        for ch_idx, value in zip(visible, values):
+
+            y_signal = value * self.gain + offset
 
             dist = abs(y_click - y_signal)
 
@@ -546,6 +944,7 @@ class EEGEditor(QtWidgets.QMainWindow):
         if len(self._undo_stack) == 0:
             return
         self.markers_df = self._undo_stack.pop()
+        self.marker_index.rebuild(self.markers_df)
         self._plot_signals()
 
     # ---------------- Save ----------------
@@ -554,20 +953,32 @@ class EEGEditor(QtWidgets.QMainWindow):
             return
         path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Save markers", "", "Text (*.txt)")
         if path:
-            out = self.markers_df.rename(columns={"sample": "sample_index"})
-            out.to_csv(path, sep="\t", index=False)
+            self._write_markers(path)
+
+    def _write_markers(self, path):
+        out = self.markers_df.rename(columns={"sample": "sample_index"})
+        out.to_csv(path, sep="\t", index=False)
+
+    # ---------------- Review session ----------------
+    def _next_recording(self):
+        if self.session is not None:
+            self.session.next_recording()
 
     # ---------------- Filters ----------------
     def _apply_bandpass(self):
         low, high = self.bp_low.value(), self.bp_high.value()
         b, a = butter(4, [low / (self.fs / 2), high / (self.fs / 2)], btype='band')
         self.signals = filtfilt(b, a, self.signals_raw, axis=1)
+        self._signals_version += 1
+        self._block_cache.clear()
         self._plot_signals()
 
     def _apply_notch(self):
         f0 = self.notch_freq.value()
         b, a = iirnotch(f0, 30, self.fs)
         self.signals = filtfilt(b, a, self.signals, axis=1)
+        self._signals_version += 1
+        self._block_cache.clear()
         self._plot_signals()
 
     # ---------------- Navigation ----------------
@@ -598,13 +1009,80 @@ class EEGEditor(QtWidgets.QMainWindow):
                 self._zoom_in()
             case QtCore.Qt.Key_Minus:
                 self._zoom_out()
+            case QtCore.Qt.Key_N:
+                self._jump_to_marker(1, bool(event.modifiers() & QtCore.Qt.ShiftModifier))
+            case QtCore.Qt.Key_P:
+                self._jump_to_marker(-1, bool(event.modifiers() & QtCore.Qt.ShiftModifier))
+
+    # ---------------- Marker navigation ----------------
+    def _jump_to_marker(self, direction, focused=False):
+        """
+        Centre la fenêtre sur le marqueur suivant (direction=1) ou précédent (-1),
+        tous channels confondus ou seulement sur le channel sélectionné (focused).
+        """
+        win_len = int(self.window_sec * self.fs)
+
+        # curseur (sample, position du channel à l'écran) : les marqueurs
+        # simultanés sur plusieurs channels sont tous visités
+        cursor = self._nav_cursor
+        if cursor is None or not (self.start_idx <= cursor[0] < self.start_idx + win_len):
+            center = self.start_idx + win_len // 2
+            cursor = (center, -1 if direction > 0 else self.n_channels)
+
+        if focused:
+            ch_idx = self._focused_channel()
+            if ch_idx is None:
+                return
+            positions = [self.channel_order.index(ch_idx)]
+        else:
+            positions = range(self.n_channels)
+        keys = [(pos, name) for pos in positions
+                for name in self._names_of_row[self.channel_order[pos]]]
+        found = (self.marker_index.next(cursor, keys) if direction > 0
+                 else self.marker_index.prev(cursor, keys))
+        if found is None:
+            return
+        sample, pos, _ = found
+        self._nav_cursor = (sample, pos)
+
+        # rend le channel du marqueur visible et le sélectionne
+        ch_idx = self.channel_order[pos]
+        if not (self.current_chan_start <= pos < self.current_chan_start + self.n_display):
+            self.current_chan_start = max(0, min(pos, self.n_channels - self.n_display))
+        self.focus_channel = ch_idx
+
+        start = int(np.clip(sample - win_len // 2, 0, self.n_times - 1))
+        if start == self.start_idx:
+            self._plot_signals()
+        else:
+            self.slider.setValue(start)
+
+    def channel_rates(self):
+        """Nombre de marqueurs et taux (par minute) de chaque channel du montage courant."""
+        duration_min = self.n_times / self.fs / 60
+        counts = [self._row_count(row) for row in range(self.n_channels)]
+        return pd.DataFrame({"count": counts,
+                             "rate_per_min": np.asarray(counts) / duration_min},
+                            index=self.channel_names)
+
+    def _activity_order(self):
+        counts = [self._row_count(row) for row in range(self.n_channels)]
+        return [int(i) for i in np.argsort(-np.asarray(counts), kind="stable")]
+
+    def _toggle_sort_by_activity(self):
+        # l'ordre est figé au moment du tri : il ne bouge pas pendant l'édition
+        self.sort_by_activity = self.btn_sort.isChecked()
+        self.channel_order = (self._activity_order() if self.sort_by_activity
+                              else list(range(self.n_channels)))
+        self._nav_cursor = None
+        self.current_chan_start = 0
+        self._plot_signals()
 
     # ---------------- Plot ----------------
     def _make_channel_ticks(self):
         ticks = []
         offset = 0
-        for i in range(self.current_chan_start,
-                       min(self.current_chan_start + self.n_display, self.n_channels)):
+        for i in self._visible_channels():
             ticks.append((offset, self.channel_names[i]))
             offset += self.channel_spacing
         return [ticks]
@@ -618,12 +1096,12 @@ class EEGEditor(QtWidgets.QMainWindow):
 
         win_len = int(self.window_sec * self.fs)
         end_idx = min(self.start_idx + win_len, self.n_times)
+        block = self._get_block(self.start_idx, end_idx)
 
         offset = 0
-        for ch_idx in range(self.current_chan_start,
-                            min(self.current_chan_start + self.n_display, self.n_channels)):
+        for row, ch_idx in enumerate(self._visible_channels()):
 
-            sig = self.signals[ch_idx, self.start_idx:end_idx] * self.gain
+            sig = block[row] * self.gain
             t = self.times[self.start_idx:end_idx]
 
                                                                                         # dessine les marquages
@@ -639,6 +1117,7 @@ class EEGEditor(QtWidgets.QMainWindow):
             offset += self.channel_spacing
 
         self._update_spikes_display()
+        self._update_spectro()
 
     def _update_spikes_display(self):
         if self.markers_df is None:
@@ -646,25 +1125,143 @@ class EEGEditor(QtWidgets.QMainWindow):
 
         win_len = int(self.window_sec * self.fs)
         end_idx = min(self.start_idx + win_len, self.n_times)
+        block = self._get_block(self.start_idx, end_idx)
 
         offset = 0
-        for ch_idx in range(self.current_chan_start,
-                            min(self.current_chan_start + self.n_display, self.n_channels)):
-
-            rows = self.markers_df[self.markers_df["channel"] == self.channel_names[ch_idx]]
-            idx = rows["sample"].values
+        for row, ch_idx in enumerate(self._visible_channels()):
 
-            mask = (idx >= self.start_idx) & (idx < end_idx)
-            idx = idx[mask]
+            idx = self._row_markers(ch_idx, self.start_idx, end_idx)
 
             x = self.times[idx]
-            y = self.signals[ch_idx, idx] * self.gain + offset
+            y = block[row, idx - self.start_idx] * self.gain + offset
 
             self.spike_items[ch_idx].setData(x, y)
 
             offset += self.channel_spacing
 
+    # ---------------- Spectrogram ----------------
+    def _toggle_spectro(self):
+        self.spectro_widget.setVisible(self.btn_spectro.isChecked())
+        self._update_spectro()
+
+    def _focused_channel(self):
+        visible = self._visible_channels()
+        if self.focus_channel not in visible:
+            self.focus_channel = visible[0] if visible else None
+        return self.focus_channel
+
+    def _spectro_key(self, ch_idx, tile):
+        # fmax n'est qu'un recadrage à l'affichage : il ne fait pas partie de la clé
+        return (self.montage.name, ch_idx, tile, self.spectro_nperseg,
+                self._signals_version)
+
+    def _spectro_tile_range(self):
+        """Première et dernière tuile couvrant la fenêtre affichée."""
+        win_len = int(self.window_sec * self.fs)
+        end_idx = min(self.start_idx + win_len, self.n_times)
+        first = self.start_idx // self.spectro_tile_len
+        return first, max(first, (end_idx - 1) // self.spectro_tile_len)
+
+    def _spectro_tile_data(self, ch_idx, tile):
+        # tuile + nperseg/2 de chaque côté : la 1ère fenêtre STFT est centrée sur s0
+        pad = self.spectro_nperseg // 2
+        s0 = tile * self.spectro_tile_len - pad
+        s1 = (tile + 1) * self.spectro_tile_len + pad
+        c0, c1 = max(0, s0), min(self.n_times, s1)
+        data = self.montage.apply(self.signals, [ch_idx], c0, c1)[0]
+        return np.pad(data, (c0 - s0, s1 - c1))
+
+    def _update_spectro(self):
+        if not self.btn_spectro.isChecked():
+            return
+
+        for img in self._spectro_images:
+            self.spectro_widget.removeItem(img)
+        self._spectro_images = []
+
+        # abandonne les tuiles en attente qui ne sont plus affichées
+        self._spectro_pool.clear()
+        self._spectro_pending.clear()
+
+        ch_idx = self._focused_channel()
+        if ch_idx is None:
+            return
+        self.spectro_widget.setLabel('left', f"{self.channel_names[ch_idx]} (Hz)")
+
+        first, last = self._spectro_tile_range()
+        tiles = []
+        for tile in range(first, last + 1):
+            key = self._spectro_key(ch_idx, tile)
+            if key in self._spectro_cache:
+                self._spectro_cache.move_to_end(key)
+                tiles.append((tile, self._spectro_cache[key]))
+            elif key not in self._spectro_pending:
+                self._spectro_pending.add(key)
+                self._spectro_pool.start(_SpectroTask(
+                    key, self._spectro_tile_data(ch_idx, tile), self.fs,
+                    self.spectro_nperseg, self.spectro_hop, self._spectro_signals))
+
+        self.spectro_widget.setYRange(0, self.spectro_fmax.value(), padding=0)
+
+        # niveaux de couleur calculés une fois par redessin, sur les tuiles
+        # déjà en cache, sinon sur la première tuile qui arrive
+        tiles = [(tile, *self._spectro_crop(tile, *result)) for tile, result in tiles]
+        self._spectro_levels = None
+        if tiles:
+            self._spectro_levels = np.percentile(
+                np.concatenate([power.ravel() for _, _, power in tiles]), [5, 99.5])
+        for tile, f, power in tiles:
+            self._add_spectro_image(tile, f, power)
+
+    def _spectro_crop(self, tile, f, power):
+        """
+        Tuile recadrée à fmax et à la durée de la tuile, sans les colonnes
+        centrées après la fin de l'enregistrement (zero-padding) : elles
+        fausseraient l'affichage et les niveaux de couleur.
+        """
+        keep = f <= self.spectro_fmax.value()
+        remaining = self.n_times - tile * self.spectro_tile_len
+        n_cols = min(self.spectro_tile_len // self.spectro_hop,
+                     int(np.ceil(remaining / self.spectro_hop)))
+        return f[keep], power[keep, :n_cols]
+
+    def _add_spectro_image(self, tile, f, power):
+        dt = self.spectro_hop / self.fs
+        img = pg.ImageItem(power.T)
+        img.setLookupTable(pg.colormap.get('viridis').getLookupTable())
+        img.setLevels(self._spectro_levels)
+        t0 = tile * self.spectro_tile_len / self.fs + self.times[0] - dt / 2
+        img.setRect(QtCore.QRectF(t0, f[0], power.shape[1] * dt, f[-1] - f[0]))
+        self.spectro_widget.addItem(img)
+        self._spectro_images.append(img)
+
+    def _on_spectro_tile(self, key, result):
+        self._spectro_pending.discard(key)
+        self._spectro_cache[key] = result
+        if len(self._spectro_cache) > self._spectro_cache_size:
+            self._spectro_cache.popitem(last=False)
+
+        # n'ajoute que l'image de la nouvelle tuile, si elle est affichée
+        if not self.btn_spectro.isChecked() or self.focus_channel is None:
+            return
+        tile = key[2]
+        first, last = self._spectro_tile_range()
+        if key != self._spectro_key(self.focus_channel, tile) or not first <= tile <= last:
+            return
+        f, power = self._spectro_crop(tile, *result)
+        if self._spectro_levels is None:
+            self._spectro_levels = np.percentile(power, [5, 99.5])
+        self._add_spectro_image(tile, f, power)
+
     def closeEvent(self, event):
+        # Session : sauvegarde des marqueurs et arrêt de la préparation en cours
+        if self.session is not None:
+            self.session.editor_closed(self)
+
+        # Attend les calculs de spectrogramme en cours
+        self._spectro_pool.clear()
+        self._spectro_pool.waitForDone()
+
         # Supprime explicitement les items graphiques
         self.plot_widget.clear()
         self.plot_widget.setParent(None)
@@ -675,20 +1272,244 @@ class EEGEditor(QtWidgets.QMainWindow):
 
         event.accept()
         
+    def _release_signals(self):
+        """Libère les signaux (memmaps d'une ReviewSession) pour supprimer leurs fichiers."""
+        self.signals_raw = None
+        self.signals = None
+        self._block_cache.clear()
+
     def _exit_app(self):
         self.close()
         QtWidgets.QApplication.quit()
         
 
-def launch_editor(signals, times, channel_names, markers_df=None,
-                  window_sec=20, n_display=60,
-                  resize=(1500, 800), move=(50, 200)):
+# ---------------- Review session ----------------
+def load_markers_tsv(path):
+    """Marqueurs au format Delphos / "Save mk" (colonnes channel, sample_index)."""
+    df = pd.read_table(path, sep="\t", header=0)
+    col = "sample_index" if "sample_index" in df.columns else "sample"
+    return pd.DataFrame({"channel": df["channel"], "sample": df[col]})
+
+
+def _prepare_recording(loader, recording, markers, bandpass, montage_builder, prefix):
     """
-    Lance l'éditeur EEG avec gestion propre de QApplication.
-    Compatible Jupyter / IPython et scripts classiques.
+    Exécuté dans un process séparé : chargement, filtrage, tri des marqueurs
+    et espacement des channels pour chaque montage.
+    Les signaux sont écrits en .npy (prefix + _signals.npy / _filtered.npy)
+    plutôt que renvoyés par le pipe : le process principal les ouvre en
+    memmap, sans dépicklage ni copie sur le thread graphique.
+    """
+    signals, times, channel_names = loader(recording)
+    channel_names = list(channel_names)
+
+    if markers is None:
+        markers_df = None
+    elif isinstance(markers, pd.DataFrame):
+        markers_df = markers.copy()
+    else:
+        markers_df = load_markers_tsv(markers)
+    if markers_df is not None:
+        markers_df = markers_df.sort_values("sample", kind="stable").reset_index(drop=True)
+
+    filtered_signals = None
+    if bandpass is not None:
+        fs = 1 / np.mean(np.diff(times))
+        b, a = butter(4, [bandpass[0] / (fs / 2), bandpass[1] / (fs / 2)], btype='band')
+        filtered_signals = filtfilt(b, a, signals, axis=1)
+
+    if montage_builder is not None:
+        montages = montage_builder(channel_names)
+    else:
+        montages = {"Monopolar": monopolar_montage(channel_names)}
+    spacing = {name: _compute_spacing(m, signals) for name, m in montages.items()}
+
+    signals_path = prefix + "_signals.npy"
+    np.save(signals_path, signals)
+    filtered_path = None
+    if filtered_signals is not None:
+        filtered_path = prefix + "_filtered.npy"
+        np.save(filtered_path, filtered_signals)
+
+    return dict(signals_path=signals_path, filtered_path=filtered_path,
+                times=times, channel_names=channel_names,
+                markers_df=markers_df, montages=montages,
+                bandpass=bandpass, spacing=spacing)
+
+
+def _open_prepared(prepared):
+    """Arguments d'EEGEditor à partir du résultat de _prepare_recording."""
+    kwargs = dict(prepared)
+    kwargs["signals"] = np.load(kwargs.pop("signals_path"), mmap_mode='r')
+    filtered_path = kwargs.pop("filtered_path")
+    if filtered_path is not None:
+        kwargs["filtered_signals"] = np.load(filtered_path, mmap_mode='r')
+    return kwargs
+
+
+class ReviewSession:
+    """
+    File de relecture sur plusieurs enregistrements.
+
+    sources : liste de (recording, markers), markers étant un DataFrame,
+              un chemin vers un fichier de marqueurs (load_markers_tsv) ou None.
+    loader : fonction recording -> (signals, times, channel_names). Elle est
+             exécutée dans un process séparé et doit donc être importable
+             (définie dans un module, pas dans le notebook).
+    montage_builder : fonction channel_names -> dict de montages
+                      (ex : default_montages), même contrainte que loader.
+
+    Pendant l'édition d'un enregistrement, le suivant est préparé en tâche
+    de fond. "Next rec" sauvegarde les marqueurs dans output_dir
+    (<rang>_<nom>_markers.txt) puis affiche l'enregistrement suivant.
     """
 
-    from PySide6 import QtWidgets
+    def __init__(self, sources, loader, output_dir, bandpass=None,
+                 montage_builder=None, window_sec=20, n_display=60,
+                 resize=(1500, 800), move=(50, 200)):
+        self.sources = list(sources)
+        self.loader = loader
+        self.output_dir = output_dir
+        self.bandpass = bandpass
+        self.montage_builder = montage_builder
+        self.window_sec = window_sec
+        self.n_display = n_display
+        self.resize = resize
+        self.move = move
+
+        self.index = -1
+        self.editor = None
+        self._executor = None
+        self._next = None
+        self._app = None
+        self._created_app = False
+        self._tmp_dir = None
+
+    def _submit(self, i):
+        if i >= len(self.sources):
+            return None
+        recording, markers = self.sources[i]
+        prefix = os.path.join(self._tmp_dir, f"{i:03d}")
+        return self._executor.submit(_prepare_recording, self.loader, recording,
+                                     markers, self.bandpass, self.montage_builder,
+                                     prefix)
+
+    def recording_name(self, i):
+        recording = self.sources[i][0]
+        if isinstance(recording, (str, os.PathLike)):
+            return os.path.splitext(os.path.basename(recording))[0]
+        return "recording"
+
+    def markers_path(self, i):
+        # préfixé par le rang dans la file : deux exports "EEG_1.TRC" de
+        # dossiers différents ne s'écrasent pas
+        return os.path.join(self.output_dir, f"{i + 1:03d}_{self.recording_name(i)}_markers.txt")
+
+    def start(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._app, self._created_app = _qt_app()
+        self._tmp_dir = tempfile.mkdtemp(prefix="eeg_review_")
+        self._executor = ProcessPoolExecutor(max_workers=1)
+        self._next = self._submit(0)
+        self.next_recording()
+        # aucune source préparée : pas de fenêtre, la boucle Qt ne rendrait jamais la main
+        if self.editor is not None and self._created_app:
+            self._app.exec()
+        return self
+
+    def next_recording(self):
+        previous, previous_index = self.editor, self.index
+        if previous is not None and previous.markers_df is not None:
+            previous._write_markers(self.markers_path(self.index))
+
+        # self.index n'avance qu'une fois la préparation réussie :
+        # un enregistrement qui échoue est signalé puis ignoré
+        candidate = self.index + 1
+        prepared = None
+        while candidate < len(self.sources):
+            try:
+                prepared = self._next.result()
+                break
+            except Exception as err:
+                QtWidgets.QMessageBox.warning(
+                    previous, "Review session",
+                    f"Échec de la préparation de {self.recording_name(candidate)} :\n"
+                    f"{err!r}\nEnregistrement ignoré."
+                )
+                if isinstance(err, BrokenProcessPool):
+                    self._executor.shutdown(wait=False, cancel_futures=True)
+                    self._executor = ProcessPoolExecutor(max_workers=1)
+                self._remove_tmp_files(candidate)
+                candidate += 1
+                self._next = self._submit(candidate)
+
+        if prepared is None:
+            self.index = len(self.sources)
+            self.editor = None
+            self._close_editor(previous)
+            self.shutdown()
+            if self._created_app:
+                self._app.quit()
+            return
+
+        self.index = candidate
+        self._next = self._submit(self.index + 1)
+
+        self.editor = EEGEditor(window_sec=self.window_sec,
+                                n_display=self.n_display, copy=False,
+                                **_open_prepared(prepared))
+        self.editor.session = self
+        self.editor.btn_next_rec.show()
+        self.editor.setWindowTitle(
+            f"sEEG Spike Editor - {self.recording_name(self.index)} "
+            f"({self.index + 1}/{len(self.sources)})"
+        )
+        # la nouvelle fenêtre est affichée avant de fermer l'ancienne :
+        # Qt quitterait sinon à la fermeture de la dernière fenêtre
+        self.editor.show()
+        self.editor.resize(*self.resize)
+        self.editor.move(*self.move)
+        self._close_editor(previous)
+        if previous is not None:
+            self._remove_tmp_files(previous_index)
+
+    def _close_editor(self, editor):
+        if editor is None:
+            return
+        editor.session = None
+        editor.close()
+        editor._release_signals()
+        editor.deleteLater()
+
+    def editor_closed(self, editor):
+        """Fenêtre fermée par l'utilisateur (Exit ou barre de titre)."""
+        if editor.markers_df is not None:
+            editor._write_markers(self.markers_path(self.index))
+        editor.session = None
+        editor._release_signals()
+        self.editor = None
+        self.shutdown()
+
+    def _remove_tmp_files(self, i):
+        # les memmaps de l'éditeur ont été libérés par _release_signals ;
+        # sous Windows, un fichier encore mappé ailleurs resterait en place
+        for suffix in ("_signals.npy", "_filtered.npy"):
+            try:
+                os.remove(os.path.join(self._tmp_dir, f"{i:03d}{suffix}"))
+            except OSError:
+                pass
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._next = None
+        if self._tmp_dir is not None:
+            shutil.rmtree(self._tmp_dir, ignore_errors=True)
+            self._tmp_dir = None
+
+
+def _qt_app():
+    """Retourne (QApplication, créée_ici). Compatible Jupyter / IPython."""
 
     # Cas Jupyter : active l'intégration Qt si besoin
     try:
@@ -704,6 +1525,20 @@ def launch_editor(signals, times, channel_names, markers_df=None,
     if app is None:
         app = QtWidgets.QApplication(sys.argv)
         created_app = True
+    return app, created_app
+
+
+def launch_editor(signals, times, channel_names, markers_df=None,
+                  window_sec=20, n_display=60, montages=None,
+                  resize=(1500, 800), move=(50, 200)):
+    """
+    Lance l'éditeur EEG avec gestion propre de QApplication.
+    Compatible Jupyter / IPython et scripts classiques.
+    montages : dict {nom: Montage} (ex : default_montages(channel_names)),
+    appliqués à la volée sur la fenêtre affichée. Par défaut : monopolaire.
+    """
+
+    app, created_app = _qt_app()
 
     editor = EEGEditor(
         signals=signals,
@@ -711,7 +1546,8 @@ def launch_editor(signals, times, channel_names, markers_df=None,
         channel_names=channel_names,
         markers_df=markers_df,
         window_sec=window_sec,
-        n_display=n_display
+        n_display=n_display,
+        montages=montages
     )
 
     editor.show()